@@ -1,26 +1,49 @@
 import asyncio
-from aiocoap import Context, Message, Code
+import struct
+import numpy as np
+from aiocoap import Context, Message, Code, NON
 from aiocoap.numbers.codes import GET, PUT
 from aiocoap import resource
 
 CAMERA = "coap://192.168.8.222:5683"  # CoAP server
 PATH_LAST = f"{CAMERA}/lastdetection"
-PATH_IMAGE = f"{CAMERA}/image"
+PATH_IMAGE_RAW = f"{CAMERA}/image/raw"
 PATH_CLASS = f"{CAMERA}/class"
 
-async def infer_jpeg(jpeg_bytes: bytes) -> str:
-    # for now no model is uploaded it will always return unknown
+# must match the server's RawImageResource framing
+RAW_HEADER = struct.Struct("<IIHH")  # height, width, stride, pixel format
+
+def parse_raw(payload: bytes):
+    """Decode the server's raw ROI payload (12-byte header + BGR pixels)."""
+    if len(payload) <= RAW_HEADER.size:
+        return None
+    h, w, _stride, _fmt = RAW_HEADER.unpack_from(payload)
+    return np.frombuffer(payload, np.uint8, offset=RAW_HEADER.size).reshape(h, w, 3)
+
+def infer_roi_sync(img_bgr) -> str:
+    # for now no model is uploaded it will always return unknown;
+    # the real model will be CPU-bound, so this runs off the event loop
+    # (swap asyncio.to_thread for a ProcessPoolExecutor via
+    # loop.run_in_executor once a heavyweight model lands)
     return "unknown"
 
-async def handle_notification(ctx, msg):
-    # A new timestamp means a fresh ROI is available
-    # 1) Pull image
-    img = await ctx.request(Message(code=GET, uri=PATH_IMAGE)).response
-    label = await infer_jpeg(img.payload)
-    # 2) Push label
-    await ctx.request(Message(code=PUT, uri=PATH_CLASS,
-                              payload=label.encode('utf-8'))).response
-    print("classified:", label)
+async def worker(ctx, queue):
+    # One consumer drains the notification queue so bursty observes do
+    # not serialize: the NON PUT for the previous ROI completes in the
+    # background while the next GET is already in flight.
+    while True:
+        await queue.get()
+        try:
+            img = await ctx.request(Message(code=GET, uri=PATH_IMAGE_RAW)).response
+            label = await asyncio.to_thread(infer_roi_sync, parse_raw(img.payload))
+            put = ctx.request(Message(code=PUT, uri=PATH_CLASS, mtype=NON,
+                                      payload=label.encode('utf-8')))
+            asyncio.ensure_future(put.response_nonraising)  # no ACK RTT on the hot path
+            print("classified:", label)
+        except Exception as e:
+            # a failed GET or a truncated payload loses one event, not the
+            # worker: the loop must outlive routine CoAP/UDP errors
+            print("classify error:", e)
 
 async def main():
     ctx = await Context.create_client_context()
@@ -29,8 +52,15 @@ async def main():
     r = await pr.response  # initial
     print("initial last_detection:", r.payload.decode())
 
+    queue = asyncio.Queue(maxsize=4)
+    asyncio.create_task(worker(ctx, queue))
+
     def cb(_r):
-        asyncio.create_task(handle_notification(ctx, _r))
+        # drop the oldest pending notification so we always classify
+        # the freshest ROI
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(_r)
 
     pr.observation.register_callback(cb)
     pr.observation.register_errback(lambda e: print("observe error:", e))
@@ -1,12 +1,40 @@
 import asyncio
 import logging
+import os
+import struct
 import threading
-from datetime import datetime
+import time
 import cv2
-from aiocoap import resource, Context, Message, Code, numbers
+from aiocoap import resource, Context, Message, Code, numbers, NON
 
 log = logging.getLogger("Coap-server")
 
+# libjpeg-turbo encode (SIMD) is 2-6x faster than OpenCV's bundled libjpeg
+# on edge CPUs; fall back to cv2.imencode if the library is not installed.
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR, TJSAMP_420
+    _tj = TurboJPEG()
+except Exception:
+    _tj = None
+
+# JPEG encoding is pure wasted DCT/Huffman work when the classifier is
+# co-located; raw BGR over /image/raw is the default, JPEG is opt-in.
+JPEG_ENCODE = os.environ.get("JPEG_ENCODE", "0") == "1"
+
+# raw ROI framing: height, width, stride, pixel format (12-byte header)
+RAW_HEADER = struct.Struct("<IIHH")
+RAW_FMT_BGR24 = 0
+
+# Observe notifications go out NON-confirmable: no per-observer ACK round
+# trip, eventual consistency is fine for this state. Max-Age mirrors the
+# detector's quiet window so caches expire with the motion state.
+LAST_MAX_AGE = 3
+
+# content formats resolved once at import instead of per request
+_CT_TEXT = numbers.media_types_rev['text/plain']
+_CT_JPEG = numbers.media_types_rev['image/jpeg']
+_CT_OCTET = numbers.media_types_rev['application/octet-stream']
+
 # CoAP resources
 
 class MotionResource(resource.ObservableResource):
@@ -15,7 +43,8 @@ class MotionResource(resource.ObservableResource):
         self.motion = b"false"  # "true" or "false"
 
     async def render_get(self, request):
-        return Message(payload=self.motion, content_format=numbers.media_types_rev['text/plain'])
+        return Message(payload=self.motion, mtype=NON,
+                       content_format=_CT_TEXT)
 
     def set(self, val: bytes):
         if self.motion != val:
@@ -28,7 +57,10 @@ class LastDetectionResource(resource.ObservableResource):
         self.ts = b""
 
     async def render_get(self, request):
-        return Message(payload=self.ts, content_format=numbers.media_types_rev['text/plain'])
+        msg = Message(payload=self.ts, mtype=NON,
+                      content_format=_CT_TEXT)
+        msg.opt.max_age = LAST_MAX_AGE
+        return msg
 
     def set_now(self, s: str):
         new = s.encode()
@@ -39,14 +71,44 @@ class LastDetectionResource(resource.ObservableResource):
 class ImageResource(resource.Resource):
     def __init__(self):
         super().__init__()
-        self.jpeg = b""
+        # (payload, version) swapped in one atomic attribute store, so the
+        # detector thread can publish while render_get reads without a lock
+        self._buf = (b"", 0)
 
     async def render_get(self, request):
         # latest ROI jpeg
-        return Message(payload=self.jpeg, content_format=numbers.media_types_rev['image/jpeg'])
+        payload, version = self._buf
+        msg = Message(payload=payload, content_format=_CT_JPEG)
+        msg.opt.max_age = LAST_MAX_AGE
+        if version:
+            msg.opt.etag = version.to_bytes(8, 'big')
+        return msg
+
+    def set_jpeg(self, buf):
+        # accepts bytes or any buffer-protocol object (cv2.imencode gives a
+        # uint8 ndarray); convert at most once, at store time
+        if not isinstance(buf, (bytes, bytearray)):
+            buf = memoryview(buf).cast('B').tobytes()
+        self._buf = (buf, time.monotonic_ns())
+
+class RawImageResource(resource.Resource):
+    def __init__(self):
+        super().__init__()
+        self._buf = (b"", 0)
 
-    def set_jpeg(self, buf: bytes):
-        self.jpeg = buf
+    async def render_get(self, request):
+        # latest ROI as 12-byte header + raw BGR pixels
+        payload, version = self._buf
+        msg = Message(payload=payload, content_format=_CT_OCTET)
+        msg.opt.max_age = LAST_MAX_AGE
+        if version:
+            msg.opt.etag = version.to_bytes(8, 'big')
+        return msg
+
+    def set_bgr(self, crop_bgr):
+        h, w = crop_bgr.shape[:2]
+        header = RAW_HEADER.pack(h, w, w * 3, RAW_FMT_BGR24)
+        self._buf = (header + crop_bgr.tobytes(), time.monotonic_ns())
 
 class ClassResource(resource.ObservableResource):
     def __init__(self):
@@ -54,7 +116,8 @@ class ClassResource(resource.ObservableResource):
         self.label = b""
 
     async def render_get(self, request):
-        return Message(payload=self.label, content_format=numbers.media_types_rev['text/plain'])
+        return Message(payload=self.label, mtype=NON,
+                       content_format=_CT_TEXT)
 
     async def render_put(self, request):
         new = (request.payload or b"").strip()
@@ -65,15 +128,32 @@ class ClassResource(resource.ObservableResource):
 
 # helpers to bridge detector -> resources
 
-def on_rise_factory(image_res, last_res, motion_res, jpeg_quality=85):
+def on_rise_factory(image_res, raw_res, last_res, motion_res, jpeg_quality=85,
+                    min_roi_std=8.0):
     def on_rise(crop_bgr):
         log.info("Rising edge: motion TRUE")
-        if crop_bgr is not None and crop_bgr.size > 0:
-            ok, buf = cv2.imencode(".jpg", crop_bgr, [int(cv2.IMWRITE_JPEG_QUALITY), jpeg_quality])
-            if ok:
-                image_res.set_jpeg(buf.tobytes())
-        ts = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-        last_res.set_now(ts)
+        # MOG2 also fires on lighting ripples where the crop is nearly flat
+        # and carries no information; meanStdDev reads the small ROI once,
+        # far cheaper than any encode, so gate the publish on it (the
+        # motion state below still updates either way)
+        if crop_bgr is not None and crop_bgr.size > 0 \
+                and float(cv2.meanStdDev(crop_bgr)[1].mean()) >= min_roi_std:
+            raw_res.set_bgr(crop_bgr)
+            if not JPEG_ENCODE:
+                pass
+            elif _tj is not None:
+                buf = _tj.encode(crop_bgr, quality=jpeg_quality,
+                                 pixel_format=TJPF_BGR, jpeg_subsample=TJSAMP_420)
+                image_res.set_jpeg(buf)  # already bytes, no extra copy
+            else:
+                ok, buf = cv2.imencode(".jpg", crop_bgr, [int(cv2.IMWRITE_JPEG_QUALITY), jpeg_quality])
+                if ok:
+                    image_res.set_jpeg(buf)
+            # observers only need a strictly-increasing token to know a
+            # fresh ROI exists; time_ns avoids the strftime machinery per
+            # event. Suppressed crops must not advance it, or observers
+            # would GET and re-classify the stale previous ROI.
+            last_res.set_now(str(time.time_ns()))
         motion_res.set(b"true")
     return on_rise
 
@@ -87,12 +167,14 @@ async def start_server(bind_ip="192.168.8.222", bind_port=5683, motion_detector_
     motion_res = MotionResource()
     last_res = LastDetectionResource()
     image_res = ImageResource()
+    raw_res = RawImageResource()
     class_res = ClassResource()
 
     site = resource.Site()
     site.add_resource(['motion'], motion_res)
     site.add_resource(['lastdetection'], last_res)
     site.add_resource(['image'], image_res)
+    site.add_resource(['image', 'raw'], raw_res)
     site.add_resource(['class'], class_res)
 
     await Context.create_server_context(site, bind=(bind_ip, bind_port))
@@ -102,7 +184,7 @@ async def start_server(bind_ip="192.168.8.222", bind_port=5683, motion_detector_
     if motion_detector_loop:
         t = threading.Thread(
             target=motion_detector_loop,
-            args=(on_rise_factory(image_res, last_res, motion_res),
+            args=(on_rise_factory(image_res, raw_res, last_res, motion_res),
                   on_fall_factory(motion_res)),
             name="MotionDetectorThread",
             daemon=True
@@ -1,5 +1,22 @@
 import time
 import cv2
+import numpy as np
+
+# Numba compiles the shadow-dropping threshold to vectorized native code
+# (byte compares auto-vectorize well); NumPy stays as the fallback.
+try:
+    from numba import njit, prange
+    _HAVE_NUMBA = True
+except Exception:
+    _HAVE_NUMBA = False
+
+if _HAVE_NUMBA:
+    @njit(parallel=True, fastmath=True, boundscheck=False, cache=True)
+    def _threshold_mask(fg, out):
+        h, w = fg.shape
+        for i in prange(h):
+            for j in range(w):
+                out[i, j] = 255 if fg[i, j] > 200 else 0
 
 class MotionDetector:
     """
@@ -16,7 +33,8 @@ class MotionDetector:
         show_windows=False,
         cooldown_sec=1.0,      # min gap between motion TRUE events
         quiet_sec=3.0,         # no motion this long => FALSE
-        sleep_sec=0.04
+        proc_scale=0.5,        # downscale factor for MOG2/morphology/blobs
+        use_opencl=True        # dispatch MOG2/morphology via T-API if available
     ):
         self.camera_index = camera_index
         self.min_contour_area = min_contour_area
@@ -24,24 +42,44 @@ class MotionDetector:
         self.show = show_windows
         self.cooldown = cooldown_sec
         self.quiet = quiet_sec
-        self.sleep = sleep_sec
+        self.scale = proc_scale
 
         self.bg = cv2.createBackgroundSubtractorMOG2(history=500, varThreshold=64, detectShadows=True)
-        self.kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+        # 5x5 close subsumes the old 3x3 open + dilate x2 in one pass
+        self.kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (5, 5))
+
+        # OpenCL T-API offloads MOG2 + morphology to the iGPU where present,
+        # freeing the CPU for the CoAP/asyncio side
+        self.use_opencl = use_opencl and cv2.ocl.haveOpenCL()
+        if self.use_opencl:
+            cv2.ocl.setUseOpenCL(True)
+
+        # per-frame working buffers, allocated once the capture size is
+        # known and reused every iteration (no per-frame malloc, working
+        # set stays hot in L2)
+        self._fg = None
+        self._mask_buf = None
+        self._closed = None
 
         # state
         self.motion_on = False
         self.last_motion_seen_ts = 0.0   # last time any motion was detected
         self.last_rise_ts = 0.0          # last time we announced TRUE
 
-    def _largest_contour(self, mask, min_area):
-        cnts, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        best, best_a = None, 0
-        for c in cnts:
-            a = cv2.contourArea(c)
-            if a > min_area and a > best_a:
-                best, best_a = c, a
-        return best
+    def _largest_blob(self, mask, min_area):
+        """Bounding rect (x, y, w, h) of the largest blob above min_area, or None.
+
+        One connectedComponentsWithStats pass gives area + bbox in a single
+        C call — no Python loop over contours, no separate boundingRect.
+        """
+        n, _labels, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+        if n <= 1:
+            return None
+        idx = 1 + int(np.argmax(stats[1:, cv2.CC_STAT_AREA]))
+        if stats[idx, cv2.CC_STAT_AREA] <= min_area:
+            return None
+        x, y, w, h = stats[idx, :4]
+        return int(x), int(y), int(w), int(h)
 
     def _crop_with_pad(self, frame, rect):
         x, y, w, h = rect
@@ -52,9 +90,16 @@ class MotionDetector:
         return frame[y0:y1, x0:x1].copy(), (x0, y0, x1, y1)
 
     def loop(self, on_rise, on_fall):
-        cap = cv2.VideoCapture(self.camera_index)
+        # V4L2 + MJPG: the camera ships already-compressed frames (far less
+        # USB bandwidth than YUYV) and a 1-frame kernel buffer keeps reads
+        # from lagging behind the sensor now that the loop is unthrottled
+        cap = cv2.VideoCapture(self.camera_index, cv2.CAP_V4L2)
         if not cap.isOpened():
             raise RuntimeError(f"Cannot open camera index {self.camera_index}")
+        cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
 
         try:
             while True:
@@ -62,14 +107,42 @@ class MotionDetector:
                 if not ok:
                     break
 
-                # foreground mask (ignore shadows)
-                fg = self.bg.apply(frame, learningRate=0.001)
-                _, mask = cv2.threshold(fg, 200, 255, cv2.THRESH_BINARY)
-                mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, self.kernel, iterations=1)
-                mask = cv2.dilate(mask, self.kernel, iterations=2)
+                # MOG2 streams every pixel each frame: run it (and the
+                # morphology/blob pass) on a downscaled copy, crops stay
+                # full resolution
+                small = cv2.resize(frame, None, fx=self.scale, fy=self.scale,
+                                   interpolation=cv2.INTER_AREA)
+
+                # foreground mask (MOG2 emits 0/127/255; >200 drops shadows)
+                if self.use_opencl:
+                    # UMat keeps the mask pipeline on the device; only the
+                    # small binary mask comes back for the blob pass
+                    fg = self.bg.apply(cv2.UMat(small), learningRate=0.001)
+                    _, mask = cv2.threshold(fg, 200, 255, cv2.THRESH_BINARY)
+                    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, self.kernel, iterations=1)
+                    mask = mask.get()
+                else:
+                    if self._fg is None or self._fg.shape != small.shape[:2]:
+                        h, w = small.shape[:2]
+                        self._fg = np.empty((h, w), np.uint8)
+                        self._mask_buf = np.empty((h, w), np.uint8)
+                        self._closed = np.empty((h, w), np.uint8)
+                    self.bg.apply(small, self._fg, learningRate=0.001)
+                    if _HAVE_NUMBA:
+                        _threshold_mask(self._fg, self._mask_buf)
+                    else:
+                        cv2.threshold(self._fg, 200, 255, cv2.THRESH_BINARY,
+                                      dst=self._mask_buf)
+                    cv2.morphologyEx(self._mask_buf, cv2.MORPH_CLOSE, self.kernel,
+                                     dst=self._closed, iterations=1)
+                    mask = self._closed
 
-                big = self._largest_contour(mask, self.min_contour_area)
-                motion_now = big is not None
+                rect = self._largest_blob(mask, self.min_contour_area * self.scale * self.scale)
+                if rect is not None:
+                    # map bbox back to full-resolution coordinates
+                    inv = 1.0 / self.scale
+                    rect = tuple(int(v * inv) for v in rect)
+                motion_now = rect is not None
                 now = time.time()
 
                 if motion_now:
@@ -80,8 +153,8 @@ class MotionDetector:
                     self.motion_on = True
                     self.last_rise_ts = now
                     crop = None
-                    if big is not None:
-                        crop, rect = self._crop_with_pad(frame, cv2.boundingRect(big))
+                    if rect is not None:
+                        crop, _ = self._crop_with_pad(frame, rect)
                     on_rise(crop)
 
                 # FALLING EDGE
@@ -90,15 +163,13 @@ class MotionDetector:
                     on_fall()
 
                 if self.show:
-                    if big is not None:
-                        x, y, w, h = cv2.boundingRect(big)
-                        x0, y0, x1, y1 = self._crop_with_pad(frame, (x, y, w, h))[1]
+                    if rect is not None:
+                        x0, y0, x1, y1 = self._crop_with_pad(frame, rect)[1]
                         cv2.rectangle(frame, (x0, y0), (x1, y1), (0, 255, 0), 2)
                     cv2.imshow('Motion', frame)
                     if cv2.waitKey(1) & 0xFF == 27:
                         break
-
-                time.sleep(self.sleep)
+                # no sleep: cap.read() blocks at camera cadence
         finally:
             cap.release()
             if self.show:
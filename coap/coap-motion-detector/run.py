@@ -21,8 +21,7 @@ def main():
         pad_ratio=0.12,
         show_windows=True,      # <- OFF: no contour/preview windows
         cooldown_sec=1.0,
-        quiet_sec=3.0,
-        sleep_sec=0.04
+        quiet_sec=3.0
     )
 
     asyncio.run(start_server(
@@ -1,4 +1,7 @@
 import os
+import queue
+import threading
+import time
 import cv2
 import numpy as np
 import paho.mqtt.client as mqtt
@@ -10,44 +13,189 @@ TOPIC_OUT_FMT = os.environ.get("TOPIC_OUT_FMT", "motion/device/{id}/class")
 
 print(f"[CFG] broker={BROKER}:{PORT} in={TOPIC_IN}")
 
+# libjpeg-turbo decode is ~2-3x faster than cv2.imdecode on Pi-class CPUs;
+# decoding straight to grayscale also skips the BGR2GRAY pass the Haar
+# cascade would otherwise need. Fall back to cv2 if the lib is missing.
+try:
+    from turbojpeg import TurboJPEG, TJPF_GRAY
+    _tj = TurboJPEG()
+except Exception:
+    _tj = None
+
+cv2.setUseOptimized(True)
+
+# Pre-quantized int8 MobileNetV2-SSD person detector: much better recall
+# than the Haar face proxy and int8 halves bandwidth vs FP32 on edge CPUs.
+# Falls back to the cascade when the model file is not deployed.
+MODEL_PATH = os.environ.get("MODEL_PATH", "mobilenet_ssd_int8.onnx")
+PERSON_CLASS_ID = 15
+CONF_THRESHOLD = float(os.environ.get("CONF_THRESHOLD", "0.5"))
+
+net = None
 CASCADE_PATH = cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
-face_cascade = cv2.CascadeClassifier(CASCADE_PATH)
-if face_cascade.empty():
-   raise RuntimeError("Failed to load Haar cascade")
+if os.path.isfile(MODEL_PATH):
+    net = cv2.dnn.readNetFromONNX(MODEL_PATH)
+    net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+    net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+    print(f"[INIT] loaded SSD model {MODEL_PATH}")
+else:
+    if cv2.CascadeClassifier(CASCADE_PATH).empty():
+       raise RuntimeError("Failed to load Haar cascade")
+    print(f"[INIT] {MODEL_PATH} not found, using Haar cascade fallback")
+
+# CascadeClassifier is not thread-safe: concurrent detectMultiScale calls
+# on one instance can crash, so each worker thread gets its own copy
+_tls = threading.local()
 
-def classify_bgr(img_bgr: np.ndarray) -> str:
+def _get_cascade():
+    cascade = getattr(_tls, "cascade", None)
+    if cascade is None:
+        cascade = cv2.CascadeClassifier(CASCADE_PATH)
+        _tls.cascade = cascade
+    return cascade
+
+def decode_gray(jpeg_bytes: bytes):
+    """Decode JPEG bytes straight to a grayscale ndarray."""
+    if _tj is not None:
+        gray = _tj.decode(jpeg_bytes, pixel_format=TJPF_GRAY)
+        return gray.reshape(gray.shape[:2])
+    arr = np.frombuffer(jpeg_bytes, dtype=np.uint8)
+    return cv2.imdecode(arr, cv2.IMREAD_GRAYSCALE)
+
+def decode_image(jpeg_bytes: bytes):
+    """Decode to whatever the active classifier needs (BGR for SSD)."""
+    if net is None:
+        return decode_gray(jpeg_bytes)
+    if _tj is not None:
+        return _tj.decode(jpeg_bytes)  # BGR by default
+    arr = np.frombuffer(jpeg_bytes, dtype=np.uint8)
+    return cv2.imdecode(arr, cv2.IMREAD_COLOR)
+
+def classify_bgr(img: np.ndarray) -> str:
     """Return 'person' if we see a person, else 'unknown'."""
-    if img_bgr is None or img_bgr.size == 0:
+    if img is None or img.size == 0:
+        return "unknown"
+    elif net is not None:
+        blob = cv2.dnn.blobFromImage(img, 1 / 127.5, (300, 300),
+                                     (127.5, 127.5, 127.5), swapRB=True)
+        net.setInput(blob)
+        detections = net.forward().reshape(-1, 7)
+        for det in detections:
+            if int(det[1]) == PERSON_CLASS_ID and det[2] > CONF_THRESHOLD:
+                return "person"
         return "unknown"
     else:
         # Very lightweight heuristic: faces ≈ person
-        gray = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2GRAY)
-        faces = face_cascade.detectMultiScale(gray, 1.2, 3)
+        gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        # Haar cost grows with pixel count and pyramid depth: cap width at
+        # 320 px and bound the window sizes so far fewer windows get scored
+        if gray.shape[1] > 320:
+            scale = 320.0 / gray.shape[1]
+            gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        faces = _get_cascade().detectMultiScale(
+            gray, scaleFactor=1.2, minNeighbors=3,
+            minSize=(24, 24), flags=cv2.CASCADE_SCALE_IMAGE)
         return "person" if len(faces) > 0 else "unknown"
 
+# decode+classify serialize the whole subscription if run on the network
+# thread; hand work to a pool instead (OpenCV drops the GIL in imdecode
+# and detectMultiScale, so threads scale near-linearly here)
+WORKERS = max(1, (os.cpu_count() or 2) - 1)
+_jobs = queue.Queue(maxsize=WORKERS * 4)
+
 def on_message(client, userdata, msg):
     try:
-        # topic: motion/device/<id>/image
-        parts = msg.topic.split("/")
-        cam_id = parts[2] if len(parts) >= 4 else "unknown"
-        # decode JPEG bytes
-        arr = np.frombuffer(msg.payload, dtype=np.uint8)
-        img = cv2.imdecode(arr, cv2.IMREAD_COLOR)
-        label = str(classify_bgr(img))
-        out_topic = TOPIC_OUT_FMT.format(id=cam_id)
-        # publish label (qos=1 for reliability; no retain)
-        client.publish(out_topic, label, qos=1, retain=False)
-        print(f"[MQTT] {out_topic} <- {label}  (src: {msg.topic}, {len(msg.payload)}B)")
-    except Exception as e:
-        print(f"[ERR] processing {msg.topic}: {e}")
+        _jobs.put_nowait((msg.topic, msg.payload))
+    except queue.Full:
+        # images are QoS0 anyway; shed load rather than lag behind
+        print(f"[DROP] {msg.topic}: worker queue full")
+
+def publish_label(client, topic, payload_len, label):
+    # topic: motion/device/<id>/image
+    parts = topic.split("/")
+    cam_id = parts[2] if len(parts) >= 4 else "unknown"
+    out_topic = TOPIC_OUT_FMT.format(id=cam_id)
+    # publish label (qos=1 for reliability; no retain); publish is thread-safe
+    client.publish(out_topic, label, qos=1, retain=False)
+    print(f"[MQTT] {out_topic} <- {label}  (src: {topic}, {payload_len}B)")
+
+def process(client, topic, payload):
+    # decode JPEG bytes (grayscale is all the cascade needs)
+    img = decode_image(payload)
+    publish_label(client, topic, len(payload), str(classify_bgr(img)))
+
+def worker(client):
+    while True:
+        topic, payload = _jobs.get()
+        try:
+            process(client, topic, payload)
+        except Exception as e:
+            print(f"[ERR] processing {topic}: {e}")
+
+# With the SSD active, one forward pass over a batch of ROIs amortizes the
+# int8 weight fetch across all cameras publishing in the same window.
+BATCH_MAX = int(os.environ.get("BATCH_MAX", "8"))
+BATCH_WAIT_S = 0.010
+
+def classify_batch(imgs):
+    """Labels for a list of BGR images from a single net.forward()."""
+    blob = cv2.dnn.blobFromImages(imgs, 1 / 127.5, (300, 300),
+                                  (127.5, 127.5, 127.5), swapRB=True)
+    net.setInput(blob)
+    detections = net.forward().reshape(-1, 7)
+    labels = ["unknown"] * len(imgs)
+    for det in detections:  # det[0] is the image index within the batch
+        if int(det[1]) == PERSON_CLASS_ID and det[2] > CONF_THRESHOLD:
+            labels[int(det[0])] = "person"
+    return labels
+
+def batch_worker(client):
+    # single consumer: cv2.dnn nets are not re-entrant across threads
+    while True:
+        jobs = [_jobs.get()]
+        deadline = time.monotonic() + BATCH_WAIT_S
+        while len(jobs) < BATCH_MAX:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                jobs.append(_jobs.get(timeout=remaining))
+            except queue.Empty:
+                break
+        try:
+            imgs, metas = [], []
+            for topic, payload in jobs:
+                img = decode_image(payload)
+                if img is None or img.size == 0:
+                    publish_label(client, topic, len(payload), "unknown")
+                else:
+                    imgs.append(img)
+                    metas.append((topic, len(payload)))
+            if imgs:
+                for (topic, plen), label in zip(metas, classify_batch(imgs)):
+                    publish_label(client, topic, plen, label)
+        except Exception as e:
+            print(f"[ERR] processing batch of {len(jobs)}: {e}")
 
 def main():
-    client = mqtt.Client()
+    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
     client.connect(BROKER, PORT, 60)
     client.on_message = on_message
     client.subscribe(TOPIC_IN, qos=0)   # images can be QoS0
-    print(f"[INIT] subscribed to {TOPIC_IN}")
-    client.loop_forever()
+    if net is not None:
+        # single consumer: leave OpenCV's internal pool enabled so the
+        # batched net.forward() can use all cores
+        print(f"[INIT] subscribed to {TOPIC_IN}, batching up to {BATCH_MAX}")
+        threading.Thread(target=batch_worker, args=(client,), daemon=True).start()
+    else:
+        # one cascade call per worker thread: pin OpenCV to one thread so
+        # the pools don't oversubscribe the cores the workers already use
+        cv2.setNumThreads(1)
+        print(f"[INIT] subscribed to {TOPIC_IN}, {WORKERS} workers")
+        for _ in range(WORKERS):
+            threading.Thread(target=worker, args=(client,), daemon=True).start()
+    client.loop_start()
+    threading.Event().wait()
 
 if __name__ == "__main__":
     main()